@@ -1,12 +1,10 @@
+import asyncio
 import json
 import os
-import nest_asyncio
 from prompts import *
 from classes import *
 from utils import *
 
-nest_asyncio.apply()
-
 
 from llama_index.core.workflow import (
     StartEvent,
@@ -23,6 +21,15 @@ from llama_index.core.prompts import ChatPromptTemplate
 from llama_index.core.retrievers import BaseRetriever
 
 
+# Steps that call an LLM, and can be given their own model via ``step_llms``
+LLM_STEPS = (
+    "condition_bundles",
+    "guideline_queries",
+    "guideline_recommendation",
+    "case_summary",
+)
+
+
 class GuidelineRecommendationWorkflow(Workflow):
     """Guidline recommendation workflow."""
 
@@ -30,16 +37,31 @@ class GuidelineRecommendationWorkflow(Workflow):
         self,
         guideline_retriever: BaseRetriever,
         llm: LLM | None = None,
+        step_llms: dict[str, LLM] | None = None,
+        cascade: bool = False,
+        encounter_window: EncounterWindow | None = None,
         similarity_top_k: int = 20,
         output_dir: str = "data_out",
         **kwargs,
     ) -> None:
-        """Init params."""
+        """Init params.
+
+        ``step_llms`` maps entries of ``LLM_STEPS`` to the model used for that
+        step, defaulting to ``llm``. With ``cascade``, a step whose model
+        produces output that fails validation is retried on ``llm``.
+        ``encounter_window`` selects the patient's recent encounters.
+        """
         super().__init__(**kwargs)
 
         self.guideline_retriever = guideline_retriever
 
         self.llm = llm
+        self.step_llms = step_llms or {}
+        unknown_steps = set(self.step_llms) - set(LLM_STEPS)
+        if unknown_steps:
+            raise ValueError(f"Unknown LLM steps: {sorted(unknown_steps)}")
+        self.cascade = cascade
+        self.encounter_window = encounter_window
         self.similarity_top_k = similarity_top_k
 
         # if not exists, create
@@ -49,6 +71,25 @@ class GuidelineRecommendationWorkflow(Workflow):
             os.chmod(str(out_path), 0o0777)
         self.output_dir = out_path
 
+    def _get_step_llms(self, step_name: str) -> tuple[LLM, LLM | None]:
+        """Get the (llm, fallback_llm) pair for a step."""
+        llm = self.step_llms.get(step_name, self.llm)
+        fallback_llm = self.llm if self.cascade and llm is not self.llm else None
+        return llm, fallback_llm
+
+    def _on_escalate(self, ctx: Context, step_name: str):
+        """Get a callback reporting a step's escalation to the large model."""
+
+        def on_escalate(error: Exception) -> None:
+            if self._verbose:
+                ctx.write_event_to_stream(
+                    LogEvent(
+                        msg=f">> Escalating {step_name} to the large model: {error}"
+                    )
+                )
+
+        return on_escalate
+
     @step
     async def parse_patient_info(
         self, ctx: Context, ev: StartEvent
@@ -65,7 +106,13 @@ class GuidelineRecommendationWorkflow(Workflow):
         else:
             if self._verbose:
                 ctx.write_event_to_stream(LogEvent(msg=">> Reading patient info"))
-            patient_info = parse_synthea_patient(ev.patient_json_path)
+            # accept the raw upload bytes directly, falling back to a file path
+            # parse off the event loop so concurrent runs keep making progress
+            patient_info = await asyncio.to_thread(
+                parse_synthea_patient,
+                ev.get("patient_json", ev.get("patient_json_path")),
+                encounter_window=self.encounter_window,
+            )
 
             if not isinstance(patient_info, PatientInfo):
                 raise ValueError(f"Invalid patient info: {patient_info}")
@@ -93,12 +140,18 @@ class GuidelineRecommendationWorkflow(Workflow):
                 json.load(open(str(condition_info_path), "r"))
             )
         else:
+            llm, fallback_llm = self._get_step_llms("condition_bundles")
             condition_bundles = await create_condition_bundles(
-                ev.patient_info, self.llm
+                ev.patient_info,
+                llm,
+                fallback_llm=fallback_llm,
+                on_escalate=self._on_escalate(ctx, "condition_bundles"),
             )
             with open(condition_info_path, "w") as fp:
                 fp.write(condition_bundles.model_dump_json())
 
+        await ctx.set("condition_bundles", condition_bundles)
+
         return ConditionBundleEvent(bundles=condition_bundles)
 
     @step
@@ -124,9 +177,13 @@ class GuidelineRecommendationWorkflow(Workflow):
 
         # We will first generate the right set of questions to ask given the patient info.
         prompt = ChatPromptTemplate.from_messages([("user", GUIDELINE_QUERIES_PROMPT)])
-        guideline_queries = await self.llm.astructured_predict(
+        llm, fallback_llm = self._get_step_llms("guideline_queries")
+        guideline_queries = await astructured_predict_cascade(
             GuidelineQueries,
             prompt,
+            llm,
+            fallback_llm=fallback_llm,
+            on_escalate=self._on_escalate(ctx, "guideline_queries"),
             patient_info=patient_info.demographic_str,
             condition_info=ev.bundle.json(),
         )
@@ -136,7 +193,11 @@ class GuidelineRecommendationWorkflow(Workflow):
         for query in guideline_queries.queries:
             if self._verbose:
                 ctx.write_event_to_stream(LogEvent(msg=f">> Generating query: {query}"))
-            cur_guideline_docs = self.guideline_retriever.retrieve(query)
+            # the Gemini embedding's async path still blocks, so retrieve in a
+            # worker thread to keep the event loop free for other runs
+            cur_guideline_docs = await asyncio.to_thread(
+                self.guideline_retriever.retrieve, query
+            )
             guideline_docs_dict.update({d.id_: d for d in cur_guideline_docs})
         guideline_docs = guideline_docs_dict.values()
         guideline_text = "\n\n".join([g.get_content() for g in guideline_docs])
@@ -149,9 +210,13 @@ class GuidelineRecommendationWorkflow(Workflow):
         prompt = ChatPromptTemplate.from_messages(
             [("user", GUIDELINE_RECOMMENDATION_PROMPT)]
         )
-        guideline_rec = await self.llm.astructured_predict(
+        llm, fallback_llm = self._get_step_llms("guideline_recommendation")
+        guideline_rec = await astructured_predict_cascade(
             GuidelineRecommendation,
             prompt,
+            llm,
+            fallback_llm=fallback_llm,
+            on_escalate=self._on_escalate(ctx, "guideline_recommendation"),
             patient_info=patient_info.demographic_str,
             condition_info=ev.bundle.json(),
             guideline_text=guideline_text,
@@ -205,14 +270,28 @@ class GuidelineRecommendationWorkflow(Workflow):
         prompt = ChatPromptTemplate.from_messages(
             [("system", CASE_SUMMARY_SYSTEM_PROMPT), ("user", CASE_SUMMARY_USER_PROMPT)]
         )
-        case_summary = await self.llm.astructured_predict(
+        llm, fallback_llm = self._get_step_llms("case_summary")
+        case_summary = await astructured_predict_cascade(
             CaseSummary,
             prompt,
+            llm,
+            fallback_llm=fallback_llm,
+            on_escalate=self._on_escalate(ctx, "case_summary"),
             demographic_info=demographic_info,
             condition_guideline_info=condition_guideline_str,
         )
 
-        return StopEvent(result={"case_summary": case_summary})
+        # hand every stage artifact back in memory so callers never re-read disk
+        return StopEvent(
+            result={
+                "patient_info": patient_info,
+                "condition_bundles": await ctx.get("condition_bundles"),
+                "guideline_recommendations": [
+                    rec for _, rec in ev.condition_guideline_info
+                ],
+                "case_summary": case_summary,
+            }
+        )
 
 
 
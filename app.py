@@ -1,60 +1,62 @@
 import streamlit as st
-import json
-import pandas as pd
+import hashlib
 import os
-import nest_asyncio
-from prompts import *
-from classes import *
-from utils import *
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
-from llama_index.core import StorageContext, load_index_from_storage, Settings
-from llama_index.embeddings.google import GeminiEmbedding
-
-nest_asyncio.apply()
-from llama_index.llms.groq import Groq
-from agent_workflow import GuidelineRecommendationWorkflow
-import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+# Heavy modules (llama_index, pandas, agent_workflow) are imported lazily so the
+# page shell and upload widget render before the index is loaded.
+
 load_dotenv(override=True)
 
-# File paths
-OUTPUT_DIR = "data_out/workflow_output"
-PATIENT_INFO_PATH = f"{OUTPUT_DIR}/patient_info.json"
-CONDITION_BUNDLES_PATH = f"{OUTPUT_DIR}/condition_bundles.json"
-GUIDELINE_RECOMMENDATIONS_PATH = f"{OUTPUT_DIR}/guideline_recommendations.jsonl"
+PERSIST_DIR = "./stored_index"
+REF_DIR = "ref_pdf"
+# Rows per page for large encounter/medication tables
+PAGE_SIZE = 50
+# Processed uploads kept per session before the oldest is dropped
+MAX_SESSION_RESULTS = 5
 
 
-st.set_page_config(page_title="Patient Case Summary", layout="wide")
-st.title("📋 Patient Case Summary AI Agent")
+def load_retriever():
+    """Load the guideline index and its retriever."""
+    from utils import load_guideline_retriever
 
-# Loading indicator
-st.sidebar.header("Upload Patient Documents")
-persist_dir = "./stored_index"
-embed_model = GeminiEmbedding(
-    model_name="models/embedding-001", api_key=os.getenv("GEMINI_API_KEY")
-)
-Settings.embed_model = embed_model
-if os.path.exists(persist_dir):
-    storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
-    # Load the index from the storage context
-    index = load_index_from_storage(storage_context)
+    return load_guideline_retriever(persist_dir=PERSIST_DIR, ref_dir=REF_DIR)
 
-else:
-    warning = st.sidebar.warning("Embeddings not found. Computing now...")
-    with st.spinner("Computing embeddings... This may take a minute."):
-        # Load documents and build index
-        documents = SimpleDirectoryReader("ref_pdf").load_data()
-        index = VectorStoreIndex.from_documents(documents)
-        index.storage_context.persist(persist_dir=persist_dir)
-    warning.empty()
 
-    st.sidebar.success("Embeddings computed successfully!")
+@st.cache_resource(show_spinner=False)
+def warm_retriever():
+    """Start loading the retriever in the background, shared across sessions."""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warmup")
+    future = executor.submit(load_retriever)
+    executor.shutdown(wait=False)
+    return future
 
 
-retriever = index.as_retriever(similarity_top_k=3)
+def get_retriever():
+    """Wait for the background warm-up and return the retriever."""
+    future = warm_retriever()
+    try:
+        if not future.done():
+            if not os.path.exists(PERSIST_DIR):
+                warning = st.sidebar.warning("Embeddings not found. Computing now...")
+                with st.spinner("Computing embeddings... This may take a minute."):
+                    future.result()
+                warning.empty()
+                st.sidebar.success("Embeddings computed successfully!")
+            else:
+                with st.spinner("Loading guideline index..."):
+                    future.result()
+        return future.result()
+    except Exception:
+        # don't cache the failure, retry on the next rerun
+        warm_retriever.clear()
+        raise
+
 
-st.sidebar.success("Indexing complete!")
+st.set_page_config(page_title="Patient Case Summary", layout="wide")
+st.title("📋 Patient Case Summary AI Agent")
 
 # Sidebar for File Upload
 st.sidebar.header("Upload Patient Documents")
@@ -64,125 +66,165 @@ uploaded_file = st.sidebar.file_uploader(
 )
 wait_text = st.warning("Please upload a file to continue...")
 
-llm = Groq(
-    model="llama-3.3-70b-versatile",
-    api_key=os.getenv("GROQ_API_KEY"),
-)
+# Kick off index loading without blocking the first render
+retriever_future = warm_retriever()
 
 
-# Function to check if files exist after processing
-def check_files():
+def build_tables(result):
+    """Build the DataFrames for a workflow result."""
+    import pandas as pd
 
-    if (
-        os.path.exists(PATIENT_INFO_PATH)
-        and os.path.exists(CONDITION_BUNDLES_PATH)
-        and os.path.exists(GUIDELINE_RECOMMENDATIONS_PATH)
-    ):
-        return True  # All files exist
+    def to_df(items):
+        return pd.DataFrame([item.model_dump() for item in items])
 
-    return False
+    patient_info = result["patient_info"]
+    return {
+        "conditions": to_df(patient_info.conditions),
+        "recent_encounters": to_df(patient_info.recent_encounters),
+        "current_medications": to_df(patient_info.current_medications),
+        "bundles": [
+            (
+                f"{bundle.condition.display} ({bundle.condition.clinical_status})",
+                to_df(bundle.encounters),
+                to_df(bundle.medications),
+            )
+            for bundle in result["condition_bundles"].bundles
+        ],
+        "guideline_recommendations": to_df(result["guideline_recommendations"]),
+    }
+
+
+def show_table(df, key):
+    """Show a DataFrame, paginated when it has more than PAGE_SIZE rows."""
+    if len(df) > PAGE_SIZE:
+        num_pages = (len(df) - 1) // PAGE_SIZE + 1
+        page = st.number_input(
+            f"Page (1-{num_pages})",
+            min_value=1,
+            max_value=num_pages,
+            value=1,
+            key=key,
+        )
+        df = df.iloc[(page - 1) * PAGE_SIZE : page * PAGE_SIZE]
+    st.dataframe(df, use_container_width=True)
 
 
-def process_file(input_json):
+def process_file(patient_json):
     """Ensures the workflow runs inside an async event loop."""
+    import asyncio
+    from agent_workflow import GuidelineRecommendationWorkflow
+    from utils import load_workflow_llms
 
-    async def run_workflow():
+    retriever = get_retriever()
+    # fresh clients for this run's event loop
+    llm, step_llms = load_workflow_llms()
+
+    async def run_workflow(workspace):
         workflow = GuidelineRecommendationWorkflow(
             guideline_retriever=retriever,
             llm=llm,
+            step_llms=step_llms,
+            cascade=True,
+            output_dir=workspace,
             verbose=True,
             timeout=None,
         )
-        await workflow.run(
-            patient_json_path=input_json
+        return await workflow.run(
+            patient_json=patient_json
         )  # Properly await async function
 
     try:
-        asyncio.run(run_workflow())  # Ensures the function runs inside an event loop
+        # Each run gets its own workspace so concurrent sessions never share
+        # intermediate files; it is removed once the run finishes
+        with tempfile.TemporaryDirectory(prefix="case_summary_") as workspace:
+            return asyncio.run(run_workflow(workspace))
     except RuntimeError as e:
         st.error(f"Error processing file: {e}")
+        return None
 
 
 # File processing and display logic
 if uploaded_file:
     wait_text.empty()
-    st.sidebar.info("Processing uploaded file...")
 
-    # Read uploaded file content
     try:
-        uploaded_data = json.load(uploaded_file)
-        with open("uploaded_file.json", "w") as f:
-            json.dump(uploaded_data, f)
-
-        with st.spinner("Processing patient case..."):
+        # Results and their tables live in this session, keyed by upload
+        # hash, so reruns (e.g. paging a table) never re-run the workflow or
+        # touch disk, and sessions never see each other's results
+        uploaded_bytes = uploaded_file.getvalue()
+        upload_hash = hashlib.sha256(uploaded_bytes).hexdigest()
+        results = st.session_state.setdefault("workflow_results", {})
+
+        if upload_hash not in results:
+            st.sidebar.info("Processing uploaded file...")
+
+            # The upload bytes go straight to the parser, parsed exactly once
+            with st.spinner("Processing patient case..."):
+                result = process_file(uploaded_bytes)
+
+            if result is None:
+                st.sidebar.error("Processing failed.")
+                st.stop()
+            results[upload_hash] = (result, build_tables(result))
+            # dicts keep insertion order, so the first key is the oldest
+            while len(results) > MAX_SESSION_RESULTS:
+                del results[next(iter(results))]
+
+        result, tables = results[upload_hash]
+        st.sidebar.success("Processing complete!")
+
+        # Display Case Summary
+        st.subheader("📝 Case Summary")
+        st.text(result["case_summary"].render())
 
-            process_file("uploaded_file.json")
+        # Display Patient Information
+        patient_info = result["patient_info"]
+        st.subheader("🧑‍⚕️ Patient Information")
+        st.write(f"**Name:** {patient_info.given_name} {patient_info.family_name}")
+        st.write(f"**Birth Date:** {patient_info.birth_date or 'N/A'}")
+        st.write(f"**Gender:** {patient_info.gender or 'N/A'}")
 
-            if check_files():
-                st.sidebar.success("Processing complete!")
-            else:
-                st.sidebar.error("Processing failed. Files not found.")
+        # Conditions
+        st.subheader("🦠 Medical Conditions")
+        show_table(tables["conditions"], key="conditions_page")
 
-        # Load processed data from output files
-        patient_info = load_json(PATIENT_INFO_PATH)
-        condition_bundles = load_json(CONDITION_BUNDLES_PATH)
-        guideline_recommendations = load_jsonl(GUIDELINE_RECOMMENDATIONS_PATH)
+        # Recent Encounters
+        st.subheader("📅 Recent Encounters")
+        show_table(tables["recent_encounters"], key="encounters_page")
 
-        # Display Patient Information
-        if patient_info:
-            st.subheader("🧑‍⚕️ Patient Information")
-            st.write(
-                f"**Name:** {patient_info.get('given_name', 'N/A')} {patient_info.get('family_name', 'N/A')}"
-            )
-            st.write(f"**Birth Date:** {patient_info.get('birth_date', 'N/A')}")
-            st.write(f"**Gender:** {patient_info.get('gender', 'N/A')}")
-
-            # Conditions
-            if "conditions" in patient_info:
-                st.subheader("🦠 Medical Conditions")
-                conditions_df = pd.DataFrame(patient_info["conditions"])
-                st.dataframe(conditions_df, use_container_width=True)
-
-            # Recent Encounters
-            if "recent_encounters" in patient_info:
-                st.subheader("📅 Recent Encounters")
-                encounters_df = pd.DataFrame(patient_info["recent_encounters"])
-                st.dataframe(encounters_df, use_container_width=True)
-
-            # Medications
-            if "current_medications" in patient_info:
-                st.subheader("💊 Current Medications")
-                medications_df = pd.DataFrame(patient_info["current_medications"])
-                st.dataframe(medications_df, use_container_width=True)
+        # Medications
+        st.subheader("💊 Current Medications")
+        show_table(tables["current_medications"], key="medications_page")
 
         # Display Condition Bundles
-        if condition_bundles:
+        if tables["bundles"]:
             st.subheader("🔗 Condition Bundles")
-            for bundle in condition_bundles.get("bundles", []):
-                st.write(
-                    f"### {bundle['condition']['display']} ({bundle['condition']['clinical_status']})"
-                )
+            for i, (title, encounters_df, medications_df) in enumerate(
+                tables["bundles"]
+            ):
+                st.write(f"### {title}")
 
                 # Related Encounters
-                if bundle.get("encounters"):
+                if not encounters_df.empty:
                     st.write("**Encounters Related:**")
-                    encounters_df = pd.DataFrame(bundle["encounters"])
-                    st.dataframe(encounters_df, use_container_width=True)
+                    show_table(encounters_df, key=f"bundle_{i}_encounters_page")
 
                 # Medications for the Condition
-                if bundle.get("medications"):
+                if not medications_df.empty:
                     st.write("**Medications:**")
-                    medications_df = pd.DataFrame(bundle["medications"])
-                    st.dataframe(medications_df, use_container_width=True)
+                    show_table(medications_df, key=f"bundle_{i}_medications_page")
 
         # Display Guideline Recommendations
-        if guideline_recommendations:
+        if not tables["guideline_recommendations"].empty:
             st.subheader("📜 Guideline Recommendations")
-            recommendations_df = pd.DataFrame(guideline_recommendations)
-            st.dataframe(recommendations_df, use_container_width=True)
+            show_table(
+                tables["guideline_recommendations"], key="recommendations_page"
+            )
 
     except Exception as e:
         st.sidebar.error(f"Error processing file: {e}")
 
 else:
     st.sidebar.info("Upload a JSON or JSONL file to analyze patient cases.")
+    if retriever_future.done() and retriever_future.exception() is None:
+        st.sidebar.success("Indexing complete!")
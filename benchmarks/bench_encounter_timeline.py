@@ -0,0 +1,104 @@
+"""Benchmark encounter selection on large synthetic patient histories.
+
+Compares the previous sort-and-slice selection of the last 3 encounters with
+EncounterTimeline's heap-based top-N, and times the bisect range query and
+per-condition windows, for histories of increasing size.
+
+Usage:
+    python benchmarks/bench_encounter_timeline.py --sizes 1000,10000,100000
+"""
+
+import argparse
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from classes import EncounterWindow
+from utils import EncounterTimeline
+
+REASON_CODES = [str(100000 + i) for i in range(20)]
+
+
+def synthetic_encounters(n: int, seed: int = 0) -> list[dict]:
+    """Synthea-shaped encounters with random start dates over ~70 years."""
+    rng = random.Random(seed)
+    start = datetime(1955, 1, 1)
+    encounters = []
+    for _ in range(n):
+        offset = timezone(timedelta(hours=rng.choice([-8, -7])))
+        date = start + timedelta(seconds=rng.randrange(70 * 365 * 24 * 3600))
+        encounter = {
+            "resourceType": "Encounter",
+            "period": {"start": date.replace(tzinfo=offset).isoformat()},
+            "type": [{"coding": [{"display": "General examination"}]}],
+        }
+        if rng.random() < 0.5:
+            code = rng.choice(REASON_CODES)
+            encounter["reasonCode"] = [
+                {"coding": [{"code": code, "display": f"Condition {code}"}]}
+            ]
+        encounters.append(encounter)
+    return encounters
+
+
+def sort_and_slice(encounters: list[dict], n: int = 3) -> list[dict]:
+    """The previous selection: parse, sort everything, keep the last n."""
+
+    def get_encounter_date(enc):
+        period = enc.get("period", {})
+        start = period.get("start")
+        return datetime.fromisoformat(start) if start else datetime.min
+
+    return sorted(encounters, key=get_encounter_date)[-n:]
+
+
+def best_of(fn, repeat: int) -> float:
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    last_3 = EncounterWindow(last_n=3)
+    since = EncounterWindow(last_n=None, since="2020-01-01")
+    per_condition = EncounterWindow(last_n=3, per_condition=3)
+
+    print(
+        f"{'encounters':>10} {'sort+slice':>11} {'heap last3':>11} {'parse only':>11} "
+        f"{'since':>9} {'per-cond':>9} {'speedup':>8}"
+    )
+    for n in [int(size) for size in args.sizes.split(",")]:
+        encounters = synthetic_encounters(n)
+        assert sort_and_slice(encounters) == EncounterTimeline(encounters).select(
+            last_3
+        )
+
+        baseline = best_of(lambda: sort_and_slice(encounters), args.repeat)
+        heap = best_of(
+            lambda: EncounterTimeline(encounters).select(last_3), args.repeat
+        )
+        parse_only = best_of(lambda: EncounterTimeline(encounters), args.repeat)
+        since_query = best_of(
+            lambda: EncounterTimeline(encounters).select(since), args.repeat
+        )
+        per_condition_query = best_of(
+            lambda: EncounterTimeline(encounters).select(per_condition, REASON_CODES),
+            args.repeat,
+        )
+        print(
+            f"{n:>10} {baseline * 1000:>9.2f}ms {heap * 1000:>9.2f}ms "
+            f"{parse_only * 1000:>9.2f}ms {since_query * 1000:>7.2f}ms "
+            f"{per_condition_query * 1000:>7.2f}ms {baseline / heap:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
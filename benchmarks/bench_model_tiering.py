@@ -0,0 +1,258 @@
+"""Per-step latency and token benchmark for model tiering.
+
+Runs each of the workflow's LLM steps on the large model only and on the
+tiered configuration (utils.DEFAULT_STEP_MODELS with the cascade), then
+reports mean latency, token usage and escalations per step, and what tiering
+saves over the large-only baseline.
+
+By default the real Groq models are called (GROQ_API_KEY required). With
+--stub the local stub server is used instead, with --fast-latency and
+--large-latency standing in for the two models.
+
+Usage:
+    python benchmarks/bench_model_tiering.py --repeats 3
+    python benchmarks/bench_model_tiering.py --stub --fast-latency 0.2 --large-latency 1.0
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from dotenv import load_dotenv
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.callbacks import CallbackManager, TokenCountingHandler
+from llama_index.core.prompts import ChatPromptTemplate
+from llama_index.llms.groq import Groq
+from openai import BadRequestError
+
+from agent_workflow import LLM_STEPS
+from classes import (
+    CaseSummary,
+    ConditionBundles,
+    GuidelineQueries,
+    GuidelineRecommendation,
+)
+from prompts import (
+    CASE_SUMMARY_SYSTEM_PROMPT,
+    CASE_SUMMARY_USER_PROMPT,
+    CONDITION_BUNDLE_PROMPT,
+    GUIDELINE_QUERIES_PROMPT,
+    GUIDELINE_RECOMMENDATION_PROMPT,
+)
+from stub_servers import start_stub_servers
+from utils import (
+    DEFAULT_STEP_MODELS,
+    LARGE_MODEL,
+    astructured_predict_cascade,
+    generate_condition_guideline_str,
+    parse_synthea_patient,
+)
+
+
+class ModelClients:
+    """One Groq client and token counter per model name."""
+
+    def __init__(self, client_kwargs: dict) -> None:
+        self.client_kwargs = client_kwargs
+        self.clients = {}
+        self.counters = {}
+
+    def get(self, model: str) -> Groq:
+        if model not in self.clients:
+            counter = TokenCountingHandler()
+            self.counters[model] = counter
+            self.clients[model] = Groq(
+                model=model,
+                callback_manager=CallbackManager([counter]),
+                **self.client_kwargs,
+            )
+        return self.clients[model]
+
+    def reset_counts(self) -> None:
+        for counter in self.counters.values():
+            counter.reset_counts()
+
+    def token_counts(self, model: str) -> tuple[int, int]:
+        counter = self.counters.get(model)
+        if counter is None:
+            return 0, 0
+        return counter.prompt_llm_token_count, counter.completion_llm_token_count
+
+
+async def build_step_inputs(patient_path: str, large_llm) -> dict:
+    """Build the prompt and arguments for each step, as the workflow does.
+
+    Downstream inputs (bundle, recommendation) come from one untimed pass on
+    the large model so every configuration sees identical inputs.
+    """
+    patient_info = parse_synthea_patient(patient_path)
+    guideline_docs = SimpleDirectoryReader(str(ROOT / "ref_pdf")).load_data()
+    guideline_text = "\n\n".join(d.get_content() for d in guideline_docs)[:6000]
+
+    bundle_prompt = ChatPromptTemplate.from_messages([("user", CONDITION_BUNDLE_PROMPT)])
+    bundle_args = {"patient_info": patient_info.json()}
+    bundles = await large_llm.astructured_predict(
+        ConditionBundles, bundle_prompt, **bundle_args
+    )
+    bundle = bundles.bundles[0]
+
+    queries_prompt = ChatPromptTemplate.from_messages(
+        [("user", GUIDELINE_QUERIES_PROMPT)]
+    )
+    rec_prompt = ChatPromptTemplate.from_messages(
+        [("user", GUIDELINE_RECOMMENDATION_PROMPT)]
+    )
+    rec_args = {
+        "patient_info": patient_info.demographic_str,
+        "condition_info": bundle.json(),
+        "guideline_text": guideline_text,
+    }
+    rec = await large_llm.astructured_predict(
+        GuidelineRecommendation, rec_prompt, **rec_args
+    )
+    summary_prompt = ChatPromptTemplate.from_messages(
+        [("system", CASE_SUMMARY_SYSTEM_PROMPT), ("user", CASE_SUMMARY_USER_PROMPT)]
+    )
+
+    return {
+        "condition_bundles": (ConditionBundles, bundle_prompt, bundle_args),
+        "guideline_queries": (
+            GuidelineQueries,
+            queries_prompt,
+            {
+                "patient_info": patient_info.demographic_str,
+                "condition_info": bundle.json(),
+            },
+        ),
+        "guideline_recommendation": (GuidelineRecommendation, rec_prompt, rec_args),
+        "case_summary": (
+            CaseSummary,
+            summary_prompt,
+            {
+                "demographic_info": patient_info.demographic_str,
+                "condition_guideline_info": generate_condition_guideline_str(
+                    bundle, rec
+                ),
+            },
+        ),
+    }
+
+
+async def run_step(clients, step_models, step_inputs, step_name, repeats) -> dict:
+    """Time one step under a model configuration and collect token usage."""
+    output_cls, prompt, prompt_args = step_inputs[step_name]
+    model = step_models[step_name]
+    llm = clients.get(model)
+    fallback_llm = clients.get(LARGE_MODEL) if model != LARGE_MODEL else None
+
+    stats = {"model": model, "latency": 0.0, "prompt": 0, "completion": 0}
+    stats.update({"large_tokens": 0, "escalations": 0, "failures": 0})
+
+    def on_escalate(error):
+        stats["escalations"] += 1
+
+    for _ in range(repeats):
+        clients.reset_counts()
+        start = time.perf_counter()
+        try:
+            await astructured_predict_cascade(
+                output_cls,
+                prompt,
+                llm,
+                fallback_llm=fallback_llm,
+                on_escalate=on_escalate,
+                **prompt_args,
+            )
+        except (ValueError, BadRequestError):
+            stats["failures"] += 1
+        stats["latency"] += time.perf_counter() - start
+
+        large_prompt, large_completion = clients.token_counts(LARGE_MODEL)
+        stats["large_tokens"] += large_prompt + large_completion
+        for counted_model in {model, LARGE_MODEL}:
+            prompt_tokens, completion_tokens = clients.token_counts(counted_model)
+            stats["prompt"] += prompt_tokens
+            stats["completion"] += completion_tokens
+
+    for key in ("latency", "prompt", "completion", "large_tokens"):
+        stats[key] /= repeats
+    return stats
+
+
+async def run_benchmark(args) -> None:
+    if args.stub:
+        server = start_stub_servers(
+            model_latency={
+                DEFAULT_STEP_MODELS["guideline_queries"]: args.fast_latency,
+                LARGE_MODEL: args.large_latency,
+            }
+        )
+        base_url = f"http://127.0.0.1:{server.server_port}/openai/v1"
+        clients = ModelClients({"api_key": "stub", "api_base": base_url})
+    else:
+        load_dotenv(override=True)
+        clients = ModelClients({"api_key": os.getenv("GROQ_API_KEY")})
+
+    step_inputs = await build_step_inputs(args.patient, clients.get(LARGE_MODEL))
+    configs = {
+        "large": {step_name: LARGE_MODEL for step_name in LLM_STEPS},
+        "tiered": DEFAULT_STEP_MODELS,
+    }
+
+    print(
+        f"{'step':<26} {'config':<7} {'model':<26} {'latency':>8} "
+        f"{'prompt':>7} {'compl':>6} {'large tok':>9} {'esc':>4} {'fail':>4}"
+    )
+    results = {}
+    for step_name in LLM_STEPS:
+        for config_name, step_models in configs.items():
+            stats = await run_step(
+                clients, step_models, step_inputs, step_name, args.repeats
+            )
+            results[step_name, config_name] = stats
+            print(
+                f"{step_name:<26} {config_name:<7} {stats['model']:<26} "
+                f"{stats['latency']:>7.2f}s {stats['prompt']:>7.0f} "
+                f"{stats['completion']:>6.0f} {stats['large_tokens']:>9.0f} "
+                f"{stats['escalations']:>4} {stats['failures']:>4}"
+            )
+
+    print("\nSavings from tiering (large-only minus tiered, per call):")
+    total_latency = total_tokens = 0.0
+    for step_name in LLM_STEPS:
+        large, tiered = results[step_name, "large"], results[step_name, "tiered"]
+        latency_saved = large["latency"] - tiered["latency"]
+        tokens_saved = large["large_tokens"] - tiered["large_tokens"]
+        total_latency += latency_saved
+        total_tokens += tokens_saved
+        print(
+            f"{step_name:<26} latency {latency_saved:>+7.2f}s  "
+            f"large-model tokens {tokens_saved:>+8.0f}"
+        )
+    print(
+        f"{'total':<26} latency {total_latency:>+7.2f}s  "
+        f"large-model tokens {total_tokens:>+8.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument(
+        "--patient", default=str(ROOT / "data" / "almeta_buckridge.json")
+    )
+    parser.add_argument("--stub", action="store_true", help="use the stub LLM server")
+    parser.add_argument("--fast-latency", type=float, default=0.2)
+    parser.add_argument("--large-latency", type=float, default=1.0)
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
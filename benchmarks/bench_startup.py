@@ -0,0 +1,78 @@
+"""Cold-start benchmark for the Streamlit app.
+
+Runs app.py headlessly with Streamlit's AppTest in a fresh interpreter and
+measures the time until the first script run (page shell and upload widget)
+completes. Index loading is stubbed, so no API keys or network are needed.
+Exits non-zero when the median exceeds ``--budget`` so it can guard against
+startup regressions.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--budget 3.0]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The background warm-up is stubbed out (utils is replaced before app.py
+# imports it), so only the shell render is measured and no index load,
+# embedding pass or network access happens while the interpreter exits.
+COLD_START_SNIPPET = """\
+import sys
+import time
+import types
+
+stub_utils = types.ModuleType("utils")
+stub_utils.load_guideline_retriever = lambda **kwargs: None
+sys.modules["utils"] = stub_utils
+
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=60)
+at.run()
+elapsed = time.perf_counter() - t0
+assert not at.exception, at.exception
+assert at.sidebar.get("file_uploader"), "upload widget not rendered"
+print(elapsed)
+"""
+
+
+def cold_start() -> float:
+    """Return seconds from interpreter start to the first rendered page."""
+    proc = subprocess.run(
+        [sys.executable, "-c", COLD_START_SNIPPET],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip())
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget", type=float, default=3.0, help="max median cold start (seconds)"
+    )
+    args = parser.parse_args()
+
+    timings = [cold_start() for _ in range(args.runs)]
+    median = statistics.median(timings)
+    print(f"runs:   {args.runs}")
+    print(f"min:    {min(timings):.3f}s")
+    print(f"median: {median:.3f}s")
+    print(f"max:    {max(timings):.3f}s")
+
+    if median > args.budget:
+        print(f"FAIL: median cold start exceeds budget of {args.budget:.3f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Concurrent load test for GuidelineRecommendationWorkflow.
+
+Ramps concurrency against the local stub LLM/embedding servers and reports,
+per level: throughput, p50/p95/p99 end-to-end latency, event-loop lag and
+memory per in-flight run.
+
+Two modes are supported:
+    workflow  N runs share one event loop, as a headless service would run them.
+    upload    every run gets its own thread and asyncio.run with the raw upload
+              bytes and a temporary workspace, mirroring app.process_file on
+              Streamlit script threads.
+
+Usage:
+    python benchmarks/load_test.py --concurrency 1,2,4,8 --llm-latency 0.5
+"""
+
+import argparse
+import asyncio
+import hashlib
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import httpx
+from llama_index.core import VectorStoreIndex
+from llama_index.core.embeddings import BaseEmbedding
+from llama_index.core.schema import TextNode
+from llama_index.llms.groq import Groq
+
+from agent_workflow import GuidelineRecommendationWorkflow
+from stub_servers import start_stub_servers
+
+GUIDELINE_SNIPPETS = [
+    "Topical corticosteroids are first-line therapy for atopic dermatitis flares.",
+    "Emollients should be applied liberally and frequently in atopic dermatitis.",
+    "Inhaled corticosteroids are preferred controller therapy for persistent asthma.",
+    "Short-acting beta agonists are recommended as rescue therapy for asthma.",
+    "Follow-up every 1 to 6 months is recommended to monitor asthma control.",
+    "Trigger avoidance and patient education improve long-term outcomes.",
+]
+
+
+class StubEmbedding(BaseEmbedding):
+    """Embedding model backed by the stub server's /embed endpoint.
+
+    Like GeminiEmbedding in production, the async methods block on the sync
+    request by default; ``async_embed`` switches them to a truly async client.
+    """
+
+    base_url: str
+    async_embed: bool = False
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        while True:
+            resp = httpx.post(f"{self.base_url}/embed", json={"texts": texts}, timeout=60)
+            if resp.status_code != 429:
+                resp.raise_for_status()
+                return resp.json()["embeddings"]
+            time.sleep(float(resp.headers.get("Retry-After", 1)))
+
+    async def _aembed(self, texts: List[str]) -> List[List[float]]:
+        if not self.async_embed:
+            return self._embed(texts)
+        async with httpx.AsyncClient(timeout=60) as client:
+            while True:
+                resp = await client.post(f"{self.base_url}/embed", json={"texts": texts})
+                if resp.status_code != 429:
+                    resp.raise_for_status()
+                    return resp.json()["embeddings"]
+                await asyncio.sleep(float(resp.headers.get("Retry-After", 1)))
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return (await self._aembed([query]))[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+
+
+class RSSSampler(threading.Thread):
+    """Track the peak resident set size while a level is running."""
+
+    def __init__(self, interval: float = 0.05) -> None:
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+
+def current_rss() -> int:
+    """Current resident set size in bytes (peak RSS where /proc is missing)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+async def monitor_loop_lag(lags: List[float], interval: float = 0.01) -> None:
+    """Record how late the event loop wakes up from a short sleep."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - start - interval))
+
+
+async def run_workflow(retriever, llm, patient_json: bytes) -> float:
+    """Run one case summary in its own workspace and return its latency."""
+    with tempfile.TemporaryDirectory(prefix="load_test_") as workspace:
+        workflow = GuidelineRecommendationWorkflow(
+            guideline_retriever=retriever,
+            llm=llm,
+            output_dir=workspace,
+            verbose=False,
+            timeout=None,
+        )
+        start = time.perf_counter()
+        await workflow.run(patient_json=patient_json)
+        return time.perf_counter() - start
+
+
+async def run_level_shared_loop(retriever, make_llm, patient_json, concurrency, runs):
+    # one client for the level's event loop, shared by its runs like the service
+    llm = make_llm()
+    lags = []
+    monitor = asyncio.create_task(monitor_loop_lag(lags))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded():
+        async with semaphore:
+            return await run_workflow(retriever, llm, patient_json)
+
+    results = await asyncio.gather(
+        *[bounded() for _ in range(runs)], return_exceptions=True
+    )
+    monitor.cancel()
+    return results, lags
+
+
+def run_level_threads(retriever, make_llm, patient_json, concurrency, runs):
+    lags = []
+
+    async def with_monitor():
+        monitor = asyncio.create_task(monitor_loop_lag(lags))
+        try:
+            # a client per run, as app.process_file builds for its own loop
+            return await run_workflow(retriever, make_llm(), patient_json)
+        finally:
+            monitor.cancel()
+
+    def upload():
+        # same work as the Streamlit upload path: hash, then a blocking run
+        hashlib.sha256(patient_json).hexdigest()
+        return asyncio.run(with_monitor())
+
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(upload) for _ in range(runs)]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+    return results, lags
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["workflow", "upload"], default="workflow")
+    parser.add_argument(
+        "--concurrency", default="1,2,4,8", help="comma-separated ramp levels"
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=2, help="runs per level = concurrency * rounds"
+    )
+    parser.add_argument(
+        "--patient", default=str(ROOT / "data" / "almeta_buckridge.json")
+    )
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--llm-rate-limit", type=float, default=0, help="requests/s")
+    parser.add_argument("--embed-rate-limit", type=float, default=0, help="requests/s")
+    parser.add_argument("--conditions", type=int, default=3)
+    parser.add_argument(
+        "--async-embed",
+        action="store_true",
+        help="truly async stub embeddings (production's Gemini embedding blocks)",
+    )
+    args = parser.parse_args()
+
+    server = start_stub_servers(
+        llm_latency=args.llm_latency,
+        embed_latency=args.embed_latency,
+        llm_rate_limit=args.llm_rate_limit,
+        embed_rate_limit=args.embed_rate_limit,
+        num_conditions=args.conditions,
+    )
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    index = VectorStoreIndex(
+        [TextNode(text=t) for t in GUIDELINE_SNIPPETS],
+        embed_model=StubEmbedding(base_url=base_url, async_embed=args.async_embed),
+    )
+    retriever = index.as_retriever(similarity_top_k=3)
+
+    def make_llm():
+        return Groq(model="stub", api_key="stub", api_base=f"{base_url}/openai/v1")
+
+    patient_json = Path(args.patient).read_bytes()
+
+    print(
+        f"mode={args.mode} llm_latency={args.llm_latency}s "
+        f"embed_latency={args.embed_latency}s conditions={args.conditions}"
+    )
+    print(
+        f"{'conc':>4} {'runs':>5} {'err':>4} {'runs/s':>7} {'p50':>7} {'p95':>7} "
+        f"{'p99':>7} {'lag p99':>8} {'lag max':>8} {'MB/run':>7}"
+    )
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        runs = concurrency * args.rounds
+        baseline_rss = current_rss()
+        sampler = RSSSampler()
+        sampler.start()
+        start = time.perf_counter()
+        if args.mode == "workflow":
+            results, lags = asyncio.run(
+                run_level_shared_loop(
+                    retriever, make_llm, patient_json, concurrency, runs
+                )
+            )
+        else:
+            results, lags = run_level_threads(
+                retriever, make_llm, patient_json, concurrency, runs
+            )
+        wall = time.perf_counter() - start
+        peak_rss = sampler.stop()
+
+        latencies = [r for r in results if isinstance(r, float)]
+        errors = [r for r in results if isinstance(r, BaseException)]
+        mb_per_run = (peak_rss - baseline_rss) / concurrency / 2**20
+        print(
+            f"{concurrency:>4} {runs:>5} {len(errors):>4} "
+            f"{len(latencies) / wall:>7.2f} "
+            f"{percentile(latencies, 50):>6.2f}s {percentile(latencies, 95):>6.2f}s "
+            f"{percentile(latencies, 99):>6.2f}s "
+            f"{percentile(lags, 99) * 1000:>6.1f}ms "
+            f"{max(lags, default=0) * 1000:>6.1f}ms "
+            f"{mb_per_run:>7.1f}"
+        )
+        if errors:
+            print(f"     first error: {errors[0]!r}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Import-time profile of the modules app.py depends on.
+
+Each module is imported in a fresh interpreter with ``-X importtime`` and the
+heaviest imports are reported, so it is easy to see what the page shell pays
+for on a cold start versus what is deferred to the background warm-up.
+
+Usage:
+    python benchmarks/profile_startup.py [--top 15]
+"""
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Imported at the top of app.py, paid before the first render.
+EAGER_MODULES = ["streamlit", "dotenv"]
+
+# Imported lazily by app.py, paid in the warm-up thread or on first upload.
+DEFERRED_MODULES = [
+    "pandas",
+    "llama_index.core",
+    "llama_index.embeddings.google",
+    "llama_index.llms.groq",
+    "utils",
+    "agent_workflow",
+]
+
+
+def profile_import(module: str) -> list[tuple[int, int, str]]:
+    """Return (self_us, cumulative_us, name) rows for importing a module."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def report(modules: list[str], label: str, top: int) -> float:
+    """Print the profile for a group of modules and return its total in seconds."""
+    print(f"== {label} ==")
+    total = 0.0
+    for module in modules:
+        try:
+            rows = profile_import(module)
+        except RuntimeError as e:
+            print(f"{module:<32} failed: {e}")
+            continue
+        # the last row is the requested module itself
+        cumulative = rows[-1][1] / 1e6
+        total += cumulative
+        print(f"{module:<32} {cumulative:8.3f}s")
+        for _, cum_us, name in sorted(rows, key=lambda r: r[1], reverse=True)[
+            1 : top + 1
+        ]:
+            print(f"    {cum_us / 1e6:8.3f}s  {name.strip()}")
+    print(f"{'sum':<32} {total:8.3f}s\n")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=10, help="imports listed per module")
+    args = parser.parse_args()
+
+    report(EAGER_MODULES, "eager (before first render)", args.top)
+    report(DEFERRED_MODULES, "deferred (background / on upload)", args.top)
+
+
+if __name__ == "__main__":
+    main()
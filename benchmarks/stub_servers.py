@@ -0,0 +1,268 @@
+"""Local stub LLM and embedding servers for load testing.
+
+The LLM endpoint speaks the OpenAI-compatible chat completions protocol that
+the Groq client uses, answering every structured-output tool call with a
+canned object for the requested schema. The embedding endpoint returns
+deterministic vectors. Both endpoints add a configurable latency and enforce
+an optional requests-per-second limit, replying 429 when it is exceeded.
+
+Run standalone with:
+    python benchmarks/stub_servers.py --port 8765 --llm-latency 0.5
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBED_DIM = 64
+
+
+class RateLimiter:
+    """Token bucket allowing ``rate`` requests per second (0 = unlimited)."""
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        # hold at least one token so rates below 1/s still grant requests
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+def canned_arguments(schema_name: str, num_conditions: int) -> dict:
+    """Return a valid structured output for one of the workflow's schemas."""
+    if schema_name == "ConditionBundles":
+        return {
+            "bundles": [
+                {
+                    "condition": {
+                        "code": str(100000 + i),
+                        "display": f"Stub condition {i} (disorder)",
+                        "clinical_status": "active",
+                    },
+                    "encounters": [
+                        {
+                            "date": "2020-01-01T00:00:00+00:00",
+                            "reason_display": f"Stub condition {i}",
+                            "type_display": "Follow-up encounter",
+                        }
+                    ],
+                    "medications": [
+                        {"name": "Stub medication", "instructions": "Once daily"}
+                    ],
+                }
+                for i in range(num_conditions)
+            ]
+        }
+    if schema_name == "GuidelineQueries":
+        return {
+            "queries": [
+                "first-line management of the condition",
+                "medication dosing recommendations",
+                "recommended follow-up interval",
+            ]
+        }
+    if schema_name == "GuidelineRecommendation":
+        return {
+            "guideline_source": "Stub Guidelines",
+            "recommendation_summary": "Continue current therapy and reassess.",
+            "reference_section": "Section 1",
+        }
+    if schema_name == "CaseSummary":
+        return {
+            "patient_name": "Stub Patient",
+            "age": 42,
+            "overall_assessment": "Stable across all conditions.",
+            "condition_summaries": [
+                {
+                    "condition_display": f"Stub condition {i} (disorder)",
+                    "summary": "Managed per guidelines.",
+                }
+                for i in range(num_conditions)
+            ],
+        }
+    raise KeyError(schema_name)
+
+
+def stub_embedding(text: str) -> list[float]:
+    """Deterministic unit-free embedding derived from the text hash."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [(digest[i % len(digest)] - 128) / 128 for i in range(EMBED_DIM)]
+
+
+def make_handler(
+    llm_latency: float,
+    embed_latency: float,
+    llm_limiter: RateLimiter,
+    embed_limiter: RateLimiter,
+    num_conditions: int,
+    model_latency: dict[str, float],
+):
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 429:
+                self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+
+            if self.path.endswith("/chat/completions"):
+                if not llm_limiter.acquire():
+                    return self._send_json(429, {"error": {"message": "rate limited"}})
+                time.sleep(model_latency.get(request.get("model"), llm_latency))
+                return self._send_json(200, self._chat_completion(request))
+
+            if self.path.endswith("/embed"):
+                if not embed_limiter.acquire():
+                    return self._send_json(429, {"error": {"message": "rate limited"}})
+                time.sleep(embed_latency)
+                texts = request.get("texts", [])
+                return self._send_json(
+                    200, {"embeddings": [stub_embedding(t) for t in texts]}
+                )
+
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+        def _chat_completion(self, request: dict) -> dict:
+            tools = request.get("tools") or []
+            prompt_tokens = sum(
+                len(str(m.get("content") or "")) // 4
+                for m in request.get("messages", [])
+            )
+            message = {"role": "assistant", "content": "ok"}
+            finish_reason = "stop"
+            if tools:
+                name = tools[0]["function"]["name"]
+                arguments = json.dumps(canned_arguments(name, num_conditions))
+                message = {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": f"call_{uuid.uuid4().hex[:12]}",
+                            "type": "function",
+                            "function": {"name": name, "arguments": arguments},
+                        }
+                    ],
+                }
+                finish_reason = "tool_calls"
+            completion_tokens = len(json.dumps(message)) // 4
+            return {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [
+                    {"index": 0, "message": message, "finish_reason": finish_reason}
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+
+    return StubHandler
+
+
+def start_stub_servers(
+    port: int = 0,
+    llm_latency: float = 0.5,
+    embed_latency: float = 0.05,
+    llm_rate_limit: float = 0,
+    embed_rate_limit: float = 0,
+    num_conditions: int = 3,
+    model_latency: dict[str, float] | None = None,
+) -> ThreadingHTTPServer:
+    """Start the stub servers in a daemon thread and return the server.
+
+    The LLM is served at ``http://127.0.0.1:<port>/openai/v1`` and embeddings
+    at ``http://127.0.0.1:<port>/embed``. ``model_latency`` overrides the LLM
+    latency for specific model names.
+    """
+    handler = make_handler(
+        llm_latency,
+        embed_latency,
+        RateLimiter(llm_rate_limit),
+        RateLimiter(embed_rate_limit),
+        num_conditions,
+        model_latency or {},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_model_latency(values: list[str]) -> dict[str, float]:
+    """Parse repeated ``MODEL=SECONDS`` options."""
+    model_latency = {}
+    for value in values:
+        model, _, seconds = value.rpartition("=")
+        model_latency[model] = float(seconds)
+    return model_latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--llm-rate-limit", type=float, default=0, help="requests/s")
+    parser.add_argument("--embed-rate-limit", type=float, default=0, help="requests/s")
+    parser.add_argument("--conditions", type=int, default=3)
+    parser.add_argument(
+        "--model-latency",
+        action="append",
+        default=[],
+        metavar="MODEL=SECONDS",
+        help="per-model LLM latency override, repeatable",
+    )
+    args = parser.parse_args()
+
+    server = start_stub_servers(
+        port=args.port,
+        llm_latency=args.llm_latency,
+        embed_latency=args.embed_latency,
+        llm_rate_limit=args.llm_rate_limit,
+        embed_rate_limit=args.embed_rate_limit,
+        num_conditions=args.conditions,
+        model_latency=parse_model_latency(args.model_latency),
+    )
+    print(f"Stub servers listening on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
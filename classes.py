@@ -1,5 +1,6 @@
+from datetime import datetime, timezone
 from typing import List, Optional, Tuple
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from llama_index.core.workflow import Event
 
 
@@ -17,6 +18,36 @@ class EncounterInfo(BaseModel):
     )
 
 
+class EncounterWindow(BaseModel):
+    """Which encounters to keep as a patient's recent encounters.
+
+    Each set option selects encounters and the selections are combined.
+    """
+
+    last_n: Optional[int] = Field(
+        3, ge=1, description="Keep the N most recent encounters."
+    )
+    since: Optional[datetime] = Field(
+        None,
+        description="Keep encounters starting on or after this ISO date or datetime (UTC if no offset is given).",
+    )
+    per_condition: Optional[int] = Field(
+        None,
+        ge=1,
+        description="Keep the N most recent encounters whose reason matches each included condition.",
+    )
+
+    @field_validator("since", mode="before")
+    @classmethod
+    def parse_since(cls, value):
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        if isinstance(value, datetime) and value.tzinfo is None:
+            # don't depend on the host's timezone
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+
 class MedicationInfo(BaseModel):
     name: str = Field(..., description="Name of the medication.")
     start_date: Optional[str] = Field(
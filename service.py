@@ -0,0 +1,281 @@
+"""Headless async HTTP service for the guideline recommendation workflow.
+
+Keeps the guideline index, retriever and LLM clients warm and runs submitted
+patient bundles as jobs on a bounded pool of workers.
+
+    POST /jobs              submit a Synthea FHIR bundle (JSON body), returns a job ID
+    GET  /jobs/{id}         poll job status and, once finished, its result
+    GET  /jobs/{id}/events  stream LogEvent progress as newline-delimited JSON
+    GET  /healthz           liveness, queue depth and job counts
+
+Run with:
+    python service.py --port 8080 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from agent_workflow import GuidelineRecommendationWorkflow
+from classes import LogEvent
+from utils import load_guideline_retriever, load_workflow_llms
+
+FINISHED = {"succeeded", "failed"}
+
+
+class Job:
+    """A single case summary request and its progress."""
+
+    def __init__(self, patient_json: dict) -> None:
+        self.id = uuid.uuid4().hex
+        self.patient_json = patient_json
+        self.status = "queued"
+        self.logs: list[str] = []
+        self.result: dict | None = None
+        self.error: str | None = None
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.changed = asyncio.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED
+
+    async def notify(self) -> None:
+        async with self.changed:
+            self.changed.notify_all()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "num_logs": len(self.logs),
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+def serialize_result(result: dict) -> dict:
+    """Convert the workflow's in-memory artifacts to JSON-ready dicts."""
+    return {
+        "patient_info": result["patient_info"].model_dump(),
+        "condition_bundles": result["condition_bundles"].model_dump(),
+        "guideline_recommendations": [
+            rec.model_dump() for rec in result["guideline_recommendations"]
+        ],
+        "case_summary": result["case_summary"].model_dump(),
+        "case_summary_text": result["case_summary"].render(),
+    }
+
+
+async def run_job(app: web.Application, job: Job) -> None:
+    job.status = "running"
+    await job.notify()
+    try:
+        # each job gets its own workspace for the workflow's intermediate files
+        with tempfile.TemporaryDirectory(prefix="case_summary_") as workspace:
+            workflow = GuidelineRecommendationWorkflow(
+                guideline_retriever=app["retriever"],
+                llm=app["llm"],
+                step_llms=app["step_llms"],
+                cascade=True,
+                output_dir=workspace,
+                verbose=True,
+                timeout=app["job_timeout"],
+            )
+            handler = workflow.run(patient_json=job.patient_json)
+            async for ev in handler.stream_events():
+                if isinstance(ev, LogEvent):
+                    job.logs.append(ev.msg)
+                    await job.notify()
+            job.result = serialize_result(await handler)
+        job.status = "succeeded"
+    except Exception as e:
+        job.status = "failed"
+        job.error = f"{type(e).__name__}: {e}"
+    finally:
+        # the patient bundle is no longer needed once the run is over
+        job.patient_json = None
+        job.finished_at = time.time()
+        await job.notify()
+
+
+async def worker(app: web.Application) -> None:
+    queue = app["queue"]
+    while True:
+        job = await queue.get()
+        try:
+            await run_job(app, job)
+        finally:
+            queue.task_done()
+
+
+def evict_finished_jobs(app: web.Application) -> None:
+    """Drop the oldest finished jobs once more than max_jobs are retained."""
+    jobs = app["jobs"]
+    for job_id in list(jobs):
+        if len(jobs) <= app["max_jobs"]:
+            break
+        if jobs[job_id].done:
+            del jobs[job_id]
+
+
+def get_job(request: web.Request) -> Job:
+    job = request.app["jobs"].get(request.match_info["job_id"])
+    if job is None:
+        raise web.HTTPNotFound(
+            text=json.dumps({"error": "unknown job"}), content_type="application/json"
+        )
+    return job
+
+
+async def submit_job(request: web.Request) -> web.Response:
+    body = await request.read()
+    if not body:
+        return web.json_response({"error": "empty request body"}, status=400)
+    # parse once, off the event loop; the workflow takes the parsed bundle
+    try:
+        patient_json = await asyncio.to_thread(json.loads, body)
+    except ValueError as e:
+        return web.json_response({"error": f"invalid JSON: {e}"}, status=400)
+    if not isinstance(patient_json, dict):
+        return web.json_response(
+            {"error": "request body must be a JSON object"}, status=400
+        )
+
+    job = Job(patient_json)
+    try:
+        request.app["queue"].put_nowait(job)
+    except asyncio.QueueFull:
+        return web.json_response({"error": "job queue is full"}, status=503)
+
+    request.app["jobs"][job.id] = job
+    evict_finished_jobs(request.app)
+    return web.json_response(
+        {"job_id": job.id, "status": job.status},
+        status=202,
+        headers={"Location": f"/jobs/{job.id}"},
+    )
+
+
+async def job_status(request: web.Request) -> web.Response:
+    return web.json_response(get_job(request).to_dict())
+
+
+async def job_events(request: web.Request) -> web.StreamResponse:
+    job = get_job(request)
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+
+    sent = 0
+    while True:
+        async with job.changed:
+            await job.changed.wait_for(lambda: len(job.logs) > sent or job.done)
+            new_logs = job.logs[sent:]
+            done = job.done
+        for msg in new_logs:
+            await response.write((json.dumps({"msg": msg}) + "\n").encode("utf-8"))
+        sent += len(new_logs)
+        if done:
+            await response.write(
+                (json.dumps({"status": job.status, "error": job.error}) + "\n").encode(
+                    "utf-8"
+                )
+            )
+            break
+
+    await response.write_eof()
+    return response
+
+
+async def healthz(request: web.Request) -> web.Response:
+    jobs = request.app["jobs"].values()
+    return web.json_response(
+        {
+            "status": "ok",
+            "queued": request.app["queue"].qsize(),
+            "running": sum(job.status == "running" for job in jobs),
+            "retained_jobs": len(request.app["jobs"]),
+        }
+    )
+
+
+async def on_startup(app: web.Application) -> None:
+    # load the index once and keep the retriever and LLM clients warm
+    app["retriever"] = await asyncio.to_thread(
+        load_guideline_retriever, app["persist_dir"], app["ref_dir"]
+    )
+    app["llm"], app["step_llms"] = load_workflow_llms()
+    app["workers"] = [
+        asyncio.create_task(worker(app)) for _ in range(app["num_workers"])
+    ]
+
+
+async def on_cleanup(app: web.Application) -> None:
+    for task in app["workers"]:
+        task.cancel()
+    await asyncio.gather(*app["workers"], return_exceptions=True)
+
+
+def create_app(
+    num_workers: int = 4,
+    max_queue: int = 100,
+    max_jobs: int = 1000,
+    job_timeout: float | None = None,
+    max_body_mb: int = 50,
+    persist_dir: str = "./stored_index",
+    ref_dir: str = "ref_pdf",
+) -> web.Application:
+    """Build the service application."""
+    app = web.Application(client_max_size=max_body_mb * 2**20)
+    app["num_workers"] = num_workers
+    app["queue"] = asyncio.Queue(maxsize=max_queue)
+    app["jobs"] = OrderedDict()
+    app["max_jobs"] = max_jobs
+    app["job_timeout"] = job_timeout
+    app["persist_dir"] = persist_dir
+    app["ref_dir"] = ref_dir
+
+    app.router.add_post("/jobs", submit_job)
+    app.router.add_get("/jobs/{job_id}", job_status)
+    app.router.add_get("/jobs/{job_id}/events", job_events)
+    app.router.add_get("/healthz", healthz)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4, help="concurrent workflow runs")
+    parser.add_argument("--max-queue", type=int, default=100, help="pending jobs before 503")
+    parser.add_argument("--max-jobs", type=int, default=1000, help="jobs retained for polling")
+    parser.add_argument("--job-timeout", type=float, default=None, help="seconds per job")
+    args = parser.parse_args()
+
+    load_dotenv(override=True)
+    web.run_app(
+        create_app(
+            num_workers=args.workers,
+            max_queue=args.max_queue,
+            max_jobs=args.max_jobs,
+            job_timeout=args.job_timeout,
+        ),
+        host=args.host,
+        port=args.port,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,183 @@
 from classes import *
 from prompts import *
+import bisect
+import heapq
 import json
-from datetime import datetime
+import logging
+import os
+from array import array
+from datetime import datetime, timezone
+from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
+from llama_index.core import StorageContext, load_index_from_storage, Settings
 from llama_index.core.llms import LLM
 from llama_index.core.prompts import ChatPromptTemplate
-import streamlit as st
+from typing import Callable
 
+logger = logging.getLogger(__name__)
 
-# Function to load JSON files
-def load_json(file_path):
-    try:
-        with open(file_path, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        st.error(f"Error loading JSON: {e}")
-        return None
 
+LARGE_MODEL = "llama-3.3-70b-versatile"
+FAST_MODEL = "llama-3.1-8b-instant"
+
+# Small fast model for query generation and bundling, large model for the
+# clinical reasoning steps
+DEFAULT_STEP_MODELS = {
+    "condition_bundles": FAST_MODEL,
+    "guideline_queries": FAST_MODEL,
+    "guideline_recommendation": LARGE_MODEL,
+    "case_summary": LARGE_MODEL,
+}
+
+
+def load_guideline_index(persist_dir: str = "./stored_index", ref_dir: str = "ref_pdf"):
+    """Load the guideline index from disk, computing embeddings if it is missing."""
+    from llama_index.embeddings.google import GeminiEmbedding
+
+    Settings.embed_model = GeminiEmbedding(
+        model_name="models/embedding-001", api_key=os.getenv("GEMINI_API_KEY")
+    )
+    if os.path.exists(persist_dir):
+        storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+        # Load the index from the storage context
+        return load_index_from_storage(storage_context)
+
+    # Load documents and build index
+    documents = SimpleDirectoryReader(ref_dir).load_data()
+    index = VectorStoreIndex.from_documents(documents)
+    index.storage_context.persist(persist_dir=persist_dir)
+    return index
+
+
+def load_guideline_retriever(
+    persist_dir: str = "./stored_index", ref_dir: str = "ref_pdf"
+):
+    """Load the guideline index and return its retriever."""
+    index = load_guideline_index(persist_dir=persist_dir, ref_dir=ref_dir)
+    return index.as_retriever(similarity_top_k=3)
+
+
+def load_workflow_llms(step_models: dict[str, str] | None = None):
+    """Build the LLM clients used by the workflow.
+
+    Returns ``(llm, step_llms)``: the large model client plus one client per
+    step, sharing clients between steps on the same model. The clients keep
+    an async connection pool bound to the event loop that first uses them,
+    so build a fresh set for every event loop that runs the workflow.
+    """
+    from llama_index.llms.groq import Groq
+
+    clients = {}
+
+    def get_client(model):
+        if model not in clients:
+            clients[model] = Groq(model=model, api_key=os.getenv("GROQ_API_KEY"))
+        return clients[model]
+
+    llm = get_client(LARGE_MODEL)
+    step_llms = {
+        step_name: get_client(model)
+        for step_name, model in (step_models or DEFAULT_STEP_MODELS).items()
+    }
+    return llm, step_llms
+
+
+def get_encounter_timestamp(encounter: dict) -> float:
+    period = encounter.get("period", {})
+    start = period.get("start")
+    if not start:
+        return float("-inf")
+    start_date = datetime.fromisoformat(start)
+    if start_date.tzinfo is None:
+        # match EncounterWindow.since, which treats naive values as UTC
+        start_date = start_date.replace(tzinfo=timezone.utc)
+    return start_date.timestamp()
 
-# Function to load JSONL files
-def load_jsonl(file_path):
-    try:
-        with open(file_path, "r") as f:
-            return [json.loads(line) for line in f]
-    except Exception as e:
-        st.error(f"Error loading JSONL: {e}")
-        return []
 
+class EncounterTimeline:
+    """A patient's encounters indexed by start time.
 
-def parse_synthea_patient(file_path: str, filter_active: bool = True) -> PatientInfo:
-    # Load the Synthea-generated FHIR Bundle
-    with open(file_path, "r") as f:
-        bundle = json.load(f)
+    Start dates are parsed once. Top-N queries use a heap over the parsed
+    timestamps; the sorted timestamp array used for bisect range queries and
+    the reason code index are only built on first use.
+    """
+
+    def __init__(self, encounters: list[dict]) -> None:
+        self.encounters = encounters
+        self.timestamps = array("d", map(get_encounter_timestamp, encounters))
+        self._order = None
+        self._sorted_timestamps = None
+        self._by_reason_code = None
+
+    def _key(self, pos: int) -> tuple[float, int]:
+        # ties keep file order, as a stable sort would
+        return (self.timestamps[pos], pos)
+
+    def _build_order(self) -> None:
+        self._order = array("l", sorted(range(len(self.encounters)), key=self._key))
+        self._sorted_timestamps = array("d", (self.timestamps[i] for i in self._order))
+
+    def last(self, n: int, positions=None) -> list[int]:
+        """Positions of the n most recent encounters, optionally among ``positions``."""
+        if positions is None:
+            positions = range(len(self.encounters))
+        return heapq.nlargest(n, positions, key=self._key)
+
+    def between(self, start: float | None = None, end: float | None = None) -> list[int]:
+        """Positions of encounters starting in [start, end)."""
+        if self._order is None:
+            self._build_order()
+        lo = 0 if start is None else bisect.bisect_left(self._sorted_timestamps, start)
+        hi = (
+            len(self._order)
+            if end is None
+            else bisect.bisect_left(self._sorted_timestamps, end)
+        )
+        return list(self._order[lo:hi])
+
+    def with_reason_code(self, code: str) -> list[int]:
+        """Positions of encounters whose reason includes the given code."""
+        if self._by_reason_code is None:
+            self._by_reason_code = {}
+            for pos, encounter in enumerate(self.encounters):
+                codes = {
+                    coding.get("code")
+                    for reason in encounter.get("reasonCode", [])
+                    for coding in reason.get("coding", [])
+                }
+                for reason_code in codes:
+                    self._by_reason_code.setdefault(reason_code, []).append(pos)
+        return self._by_reason_code.get(code, [])
+
+    def select(
+        self, window: EncounterWindow, condition_codes: list[str] = ()
+    ) -> list[dict]:
+        """Encounters selected by the window, oldest first."""
+        positions = set()
+        if window.last_n:
+            positions.update(self.last(window.last_n))
+        if window.since:
+            positions.update(self.between(start=window.since.timestamp()))
+        if window.per_condition:
+            for code in condition_codes:
+                positions.update(
+                    self.last(window.per_condition, self.with_reason_code(code))
+                )
+        return [self.encounters[pos] for pos in sorted(positions, key=self._key)]
+
+
+def parse_synthea_patient(
+    source: str | bytes | dict,
+    filter_active: bool = True,
+    encounter_window: EncounterWindow | None = None,
+) -> PatientInfo:
+    # Load the Synthea-generated FHIR Bundle from a path, raw bytes or a parsed dict
+    if isinstance(source, dict):
+        bundle = source
+    elif isinstance(source, (bytes, bytearray)):
+        bundle = json.loads(source)
+    else:
+        with open(source, "r") as f:
+            bundle = json.load(f)
 
     patient_resource = None
     conditions = []
@@ -95,15 +242,11 @@ def parse_synthea_patient(file_path: str, filter_active: bool = True) -> Patient
                     )
                 )
 
-    # Parse encounters
-    def get_encounter_date(enc):
-        period = enc.get("period", {})
-        start = period.get("start")
-        return datetime.fromisoformat(start) if start else datetime.min
-
-    encounters_sorted = sorted(encounters, key=get_encounter_date)
-    recent_encounters = (
-        encounters_sorted[-3:] if len(encounters_sorted) > 3 else encounters_sorted
+    # Parse encounters, by default keeping the last 3
+    timeline = EncounterTimeline(encounters)
+    recent_encounters = timeline.select(
+        encounter_window or EncounterWindow(),
+        condition_codes=[c.code for c in condition_info_list],
     )
 
     encounter_info_list = []
@@ -146,13 +289,65 @@ def parse_synthea_patient(file_path: str, filter_active: bool = True) -> Patient
     return patient_info
 
 
-async def create_condition_bundles(patient_data: PatientInfo, llm: LLM):
+async def astructured_predict_cascade(
+    output_cls,
+    prompt,
+    llm: LLM,
+    fallback_llm: LLM | None = None,
+    on_escalate: Callable[[Exception], None] | None = None,
+    **prompt_args,
+):
+    """Structured predict, escalating to ``fallback_llm`` if the output fails validation.
+
+    Escalation also happens when the API rejects a malformed tool call
+    (Groq's HTTP 400 ``tool_use_failed``). ``on_escalate`` is called with the
+    error before retrying.
+    """
+    from openai import BadRequestError
+
+    try:
+        output = await llm.astructured_predict(output_cls, prompt, **prompt_args)
+        if isinstance(output, output_cls):
+            return output
+        error = ValueError(f"Invalid {output_cls.__name__}: {output}")
+    except ValueError as e:  # includes pydantic ValidationError and bad tool calls
+        error = e
+    except BadRequestError as e:
+        if fallback_llm is None or getattr(e, "code", None) != "tool_use_failed":
+            raise
+        error = e
+
+    if fallback_llm is None:
+        raise error
+    logger.warning(
+        "Escalating %s from %s to %s: %s",
+        output_cls.__name__,
+        getattr(llm, "model", type(llm).__name__),
+        getattr(fallback_llm, "model", type(fallback_llm).__name__),
+        error,
+    )
+    if on_escalate is not None:
+        on_escalate(error)
+    return await fallback_llm.astructured_predict(output_cls, prompt, **prompt_args)
+
+
+async def create_condition_bundles(
+    patient_data: PatientInfo,
+    llm: LLM,
+    fallback_llm: LLM | None = None,
+    on_escalate: Callable[[Exception], None] | None = None,
+):
 
     # we will dump the entire patient info into an LLM and have it figure out the relevant encounters/medications
     # associated with each condition
     prompt = ChatPromptTemplate.from_messages([("user", CONDITION_BUNDLE_PROMPT)])
-    condition_bundles = await llm.astructured_predict(
-        ConditionBundles, prompt, patient_info=patient_data.json()
+    condition_bundles = await astructured_predict_cascade(
+        ConditionBundles,
+        prompt,
+        llm,
+        fallback_llm=fallback_llm,
+        on_escalate=on_escalate,
+        patient_info=patient_data.json(),
     )
 
     return condition_bundles